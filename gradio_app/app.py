@@ -1,26 +1,119 @@
 
+import io
 import os
+import math
 import tempfile
-import requests
+import atexit
+import collections
+import asyncio
+import httpx
+import aiofiles
 import gradio as gr
-import scipy.io.wavfile
+import numpy as np
 import time
 import logging
 
 # Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_log_level_name = os.getenv("BICARA_LOG_LEVEL", "WARNING").upper()
+LOG_LEVEL = logging.getLevelNamesMapping().get(_log_level_name, logging.WARNING)
+logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('voice_chatbot_frontend')
+if _log_level_name not in logging.getLevelNamesMapping():
+    logger.warning("Unknown BICARA_LOG_LEVEL %r, falling back to WARNING", _log_level_name)
 
 API_URL = "http://localhost:8000/voice-chat"
 REQUEST_TIMEOUT = 300  # Timeout in seconds
+TARGET_SAMPLE_RATE = 16000  # Whisper works on 16 kHz audio
+MAX_TEMP_FILES = 32  # Number of recent response files kept on disk
+# Recordings up to this size stay in memory; larger ones spill to disk
+SPOOL_MAX_MEMORY = int(os.getenv("BICARA_SPOOL_MAX", 4 * 1024 * 1024))
+_TMPDIR = tempfile.gettempdir()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Static assets (CSS background images), resolved independently of the working directory
+ASSETS_DIR = os.path.join(BASE_DIR, "assets")
+
+# Gradio file route for an asset, used to build the CSS URLs
+def _asset_url(name):
+    return "/gradio_api/file=" + os.path.join(ASSETS_DIR, name).replace(os.sep, "/")
+
+# Shared async HTTP client so repeated requests reuse pooled keep-alive connections
+# (limits must be set on the transport; httpx ignores client-level limits when one is passed)
+CLIENT = httpx.AsyncClient(
+    timeout=REQUEST_TIMEOUT,
+    transport=httpx.AsyncHTTPTransport(
+        retries=2,
+        limits=httpx.Limits(max_connections=16, max_keepalive_connections=8)
+    )
+)
+
+def _close_client():
+    # Pooled sockets belong to Gradio's event loop, so closing them at exit is best effort
+    try:
+        asyncio.run(CLIENT.aclose())
+    except RuntimeError as e:
+        logger.debug("Could not close HTTP client cleanly: %s", e)
+
+atexit.register(_close_client)
+
+# Recently produced temp files, oldest first
+_temp_files = collections.deque()
+
+def _track_temp_file(path):
+    # Keep only the last MAX_TEMP_FILES responses on disk
+    _temp_files.append(path)
+    while len(_temp_files) > MAX_TEMP_FILES:
+        old_path = _temp_files.popleft()
+        try:
+            os.unlink(old_path)
+        except FileNotFoundError:
+            pass
+
+def _encode_audio(sr, audio_data):
+    # Runs in a worker thread; returns the encoded WAV as a file object
+    # Imported here so scipy is only loaded once the user actually sends audio
+    from scipy.io import wavfile as _wavfile
+    from scipy.signal import resample_poly
+    
+    # Send 16-bit PCM; other sample formats are scaled from their own range
+    if audio_data.dtype != np.int16:
+        if np.issubdtype(audio_data.dtype, np.integer):
+            info = np.iinfo(audio_data.dtype)
+            mid = (int(info.max) + int(info.min) + 1) / 2
+            half = (int(info.max) - int(info.min) + 1) / 2
+            audio_data = (audio_data.astype(np.float64) - mid) / half
+        audio_data = np.clip(audio_data, -1.0, 1.0)
+        audio_data = (audio_data * 32767).astype(np.int16)
+    
+    # Downsample to the rate the STT model uses
+    if sr > TARGET_SAMPLE_RATE:
+        factor = math.gcd(sr, TARGET_SAMPLE_RATE)
+        resampled = resample_poly(
+            audio_data, TARGET_SAMPLE_RATE // factor, sr // factor, axis=0
+        )
+        audio_data = np.clip(np.rint(resampled), -32768, 32767).astype(np.int16)
+        sr = TARGET_SAMPLE_RATE
+    
+    # Encode as .wav in memory when small, otherwise into a real temp file;
+    # both are handed to httpx as file objects so the WAV is never copied again
+    if audio_data.nbytes + 44 <= SPOOL_MAX_MEMORY:
+        audio_buffer = io.BytesIO()
+    else:
+        audio_buffer = tempfile.TemporaryFile(suffix=".wav", dir=_TMPDIR)
+    _wavfile.write(audio_buffer, sr, audio_data)
+    logger.info("Encoded input audio: %d bytes", audio_buffer.tell())
+    audio_buffer.seek(0)
+    
+    return audio_buffer
 
 # Voice chat function with improved error handling
-def voice_chat(audio, progress=gr.Progress()):
+async def voice_chat(audio, progress=gr.Progress()):
     if audio is None:
         return None, "⚠️ Rekaman suara diperlukan"
     
     # Update timestamp
-    logger.info(f"Processing voice request")
+    logger.info("Processing voice request")
     
     # Add progress updates
     progress(0, desc="Mengolah rekaman...")
@@ -29,97 +122,103 @@ def voice_chat(audio, progress=gr.Progress()):
         sr, audio_data = audio
         
         # Log audio details for debugging
-        logger.info(f"Audio sample rate: {sr}, shape: {audio_data.shape}")
+        logger.info("Audio sample rate: %s, shape: %s", sr, audio_data.shape)
         
-        # Save as .wav with unique filename
+        # Resampling and encoding are CPU-bound, so keep them off the event loop
         audio_filename = f"input_{int(time.time())}.wav"
-        audio_path = os.path.join(tempfile.gettempdir(), audio_filename)
-        
-        scipy.io.wavfile.write(audio_path, sr, audio_data)
-        logger.info(f"Saved input audio to: {audio_path}")
-        
-        if not os.path.exists(audio_path):
-            logger.error(f"Failed to save audio file at {audio_path}")
-            return None, "⚠️ Gagal menyimpan rekaman"
+        audio_buffer = await asyncio.to_thread(_encode_audio, sr, audio_data)
             
         progress(0.3, desc="Mengirim ke server...")
         
         # Send to FastAPI endpoint with timeout
         try:
-            logger.info(f"Sending request to {API_URL}")
-            with open(audio_path, "rb") as f:
-                files = {"file": (audio_filename, f, "audio/wav")}
-                response = requests.post(
-                    API_URL,
-                    files=files,
-                    timeout=REQUEST_TIMEOUT
-                )
+            logger.info("Sending request to %s", API_URL)
+            # httpx streams file parts of the multipart body in chunks
+            files = {"file": (audio_filename, audio_buffer, "audio/wav")}
+            # WAV compresses poorly, so ask the server not to gzip the response
+            request = CLIENT.build_request(
+                "POST", API_URL, files=files, headers={"Accept-Encoding": "identity"}
+            )
+            response = await CLIENT.send(request, stream=True)
             
-            logger.info(f"Response status: {response.status_code}, Content length: {len(response.content) if response.content else 0}")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Response status: %s, Content length: %s", response.status_code, response.headers.get('Content-Length', 'unknown'))
             
-        except requests.exceptions.Timeout:
+        except httpx.TimeoutException:
             logger.error("Request timed out")
             error_msg = "🕒 Waktu habis. Server terlalu lama merespons."
             return None, error_msg
             
-        except requests.exceptions.ConnectionError:
+        except httpx.ConnectError:
             logger.error("Connection error")
             error_msg = "🔌 Koneksi ke server gagal. Pastikan server aktif di http://localhost:8000"
             return None, error_msg
             
         except Exception as e:
-            logger.error(f"Request error: {str(e)}")
+            logger.error("Request error: %s", e)
             error_msg = f"🔴 Kesalahan: {str(e)}"
             return None, error_msg
         
+        finally:
+            audio_buffer.close()
+        
         progress(0.7, desc="Menerima jawaban...")
         
-        if response.status_code == 200:
-            logger.info("Request successful, processing response")
-            
-            # Verify content type and length
-            content_type = response.headers.get('Content-Type', '')
-            logger.info(f"Response Content-Type: {content_type}")
-            
-            if not response.content:
-                logger.error("Response content is empty")
-                error_msg = "⚠️ Server mengembalikan respons kosong"
-                return None, error_msg
-            
-            # Save response audio with unique timestamp to avoid caching issues
-            output_audio_path = os.path.join(tempfile.gettempdir(), f"tts_output_{int(time.time())}.wav")
-            
-            try:
-                with open(output_audio_path, "wb") as f:
-                    f.write(response.content)
-                logger.info(f"Saved response audio to: {output_audio_path}")
+        # Release the connection back to the pool once the body is consumed
+        try:
+            if response.status_code == 200:
+                logger.info("Request successful, processing response")
+                
+                # Verify content type before consuming the body
+                content_type = response.headers.get('Content-Type', '')
+                logger.info("Response Content-Type: %s", content_type)
+                
+                # Save response audio with a unique name to avoid caching issues
+                fd, output_audio_path = tempfile.mkstemp(prefix="tts_output_", suffix=".wav", dir=_TMPDIR)
+                os.close(fd)
+                _track_temp_file(output_audio_path)
                 
-                # Verify if file exists and has content
-                if not os.path.exists(output_audio_path) or os.path.getsize(output_audio_path) == 0:
-                    logger.error(f"Output file doesn't exist or is empty: {output_audio_path}")
-                    error_msg = "⚠️ File audio respons kosong atau tidak valid"
+                try:
+                    # Pipe the body straight from the socket into the file
+                    bytes_written = 0
+                    async with aiofiles.open(output_audio_path, "wb") as f:
+                        async for chunk in response.aiter_bytes(65536):
+                            bytes_written += await f.write(chunk)
+                    logger.info("Saved %d bytes of response audio to: %s", bytes_written, output_audio_path)
+                    
+                    # Verify that the response had content
+                    if bytes_written == 0:
+                        logger.error("Output file is empty: %s", output_audio_path)
+                        error_msg = "⚠️ Server mengembalikan respons kosong"
+                        return None, error_msg
+                    
+                except Exception as e:
+                    logger.error("Failed to save response audio: %s", e)
+                    error_msg = f"⚠️ Gagal menyimpan file audio respons: {str(e)}"
                     return None, error_msg
                 
-            except Exception as e:
-                logger.error(f"Failed to save response audio: {e}")
-                error_msg = f"⚠️ Gagal menyimpan file audio respons: {str(e)}"
-                return None, error_msg
-            
-            progress(1.0, desc="Selesai!")
-            return output_audio_path, "✅ Jawaban siap diputar"
-        else:
-            logger.error(f"Server returned error status: {response.status_code}")
-            try:
-                error_content = response.json() if response.content else {}
-                error_detail = error_content.get('message', f"Kode status: {response.status_code}")
-            except:
+                progress(1.0, desc="Selesai!")
+                return output_audio_path, "✅ Jawaban siap diputar"
+            else:
+                logger.error("Server returned error status: %s", response.status_code)
+                # Only read and parse the body when the server sent JSON
                 error_detail = f"Kode status: {response.status_code}"
-                
-            error_msg = f"⚠️ Error Server: {error_detail}"
-            return None, error_msg
+                if 'json' in response.headers.get('Content-Type', ''):
+                    try:
+                        await response.aread()
+                        payload = response.json()
+                        if isinstance(payload, dict):
+                            error_detail = payload.get('message', error_detail)
+                    except (ValueError, httpx.HTTPError):
+                        pass
+                    
+                error_msg = f"⚠️ Error Server: {error_detail}"
+                return None, error_msg
+        finally:
+            await response.aclose()
             
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+        logger.error("Unexpected error: %s", e, exc_info=True)
         error_msg = f"⚠️ Kesalahan sistem: {str(e)}"
         return None, error_msg
 
@@ -132,7 +231,7 @@ body {
     margin: 0;
     padding: 0;
     line-height: 1.6;
-    background-image: url("data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' width='100' height='100' viewBox='0 0 100 100'%3E%3Cg fill-rule='evenodd'%3E%3Cg fill='%232a3f6a' fill-opacity='0.2'%3E%3Cpath opacity='.5' d='M96 95h4v1h-4v4h-1v-4h-9v4h-1v-4h-9v4h-1v-4h-9v4h-1v-4h-9v4h-1v-4h-9v4h-1v-4h-9v4h-1v-4h-9v4h-1v-4h-9v4h-1v-4H0v-1h15v-9H0v-1h15v-9H0v-1h15v-9H0v-1h15v-9H0v-1h15v-9H0v-1h15v-9H0v-1h15v-9H0v-1h15v-9H0v-1h15V0h1v15h9V0h1v15h9V0h1v15h9V0h1v15h9V0h1v15h9V0h1v15h9V0h1v15h9V0h1v15h9V0h1v15h4v1h-4v9h4v1h-4v9h4v1h-4v9h4v1h-4v9h4v1h-4v9h4v1h-4v9h4v1h-4v9h4v1h-4v9zm-1 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-9-10h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm9-10v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-9-10h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm9-10v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-9-10h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm9-10v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-10 0v-9h-9v9h9zm-9-10h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9zm10 0h9v-9h-9v9z'/%3E%3Cpath d='M6 5V0H5v5H0v1h5v94h1V6h94V5H6z'/%3E%3C/g%3E%3C/g%3E%3C/svg%3E");
+    background-image: url('""" + _asset_url("bg.svg") + """');
     background-attachment: fixed;
 }
 
@@ -160,7 +259,7 @@ body {
     left: 0;
     width: 100%;
     height: 100%;
-    background: url('data:image/svg+xml;utf8,<svg xmlns="http://www.w3.org/2000/svg" width="100" height="100" viewBox="0 0 100 100"><rect fill="none" width="100" height="100"/><path fill="rgba(255,255,255,0.05)" d="M30,20 Q50,5 70,20 T100,40 T70,60 T30,80 T0,60 T30,40 T60,20"/></svg>');
+    background: url('""" + _asset_url("bg-header.svg") + """');
     background-size: 150px;
     opacity: 0.3;
 }
@@ -476,22 +575,76 @@ theme = gr.themes.Base().set(
     button_secondary_text_color="#e8ebf2"
 )
 
-# Recording indicator state function
-def recording_state(recording=False):
-    if recording:
-        return gr.update(visible=True), gr.update(visible=False)
-    else:
-        return gr.update(visible=False), gr.update(visible=True)
+# Status message wrappers, keyed by kind
+_STATUS_TPL = {
+    "error": ('<div class="status-box status-error">', "</div>"),
+    "warning": ('<div class="status-box status-warning">', "</div>"),
+    "success": ('<div class="status-box status-success">', "</div>"),
+}
+
+# Recording indicator states: (recording_active, ready_indicator)
+_REC_ON = (gr.update(visible=True), gr.update(visible=False))
+_REC_OFF = (gr.update(visible=False), gr.update(visible=True))
+
+# Static HTML blocks used in the layout
+_HEADER_HTML = """
+<div class="app-header">
+    <h1 class="app-logo">BICARA</h1>
+    <p class="app-tagline">Asisten Pintar berbahasa Indonesia</p>
+</div>
+"""
+
+_INPUT_CARD_HTML = """
+<div class="card-header">
+    <div class="card-icon">🎙️</div>
+    <h2 class="card-title">Rekam Pesan Anda</h2>
+</div>
+"""
+
+_READY_HTML = """
+<div class="ready-to-record">
+    <span class="status-icon">⚪</span> Siap merekam suara Anda
+</div>
+"""
+
+_RECORDING_HTML = """
+<div class="now-recording">
+    <span class="status-icon">⦿</span> Merekam suara...
+</div>
+"""
+
+_PROGRESS_HTML = """
+<div class="progress-bar">
+    <div class="progress-status">
+        <div class="progress-icon">⏳</div>
+        <div class="progress-text">Memproses permintaan...</div>
+    </div>
+    <div class="progress-track">
+        <div class="progress-fill"></div>
+    </div>
+</div>
+"""
+
+_OUTPUT_CARD_HTML = """
+<div class="card-header">
+    <div class="card-icon">🔊</div>
+    <h2 class="card-title">Respon Asisten</h2>
+</div>
+"""
+
+_FOOTER_HTML = """
+<div class="app-footer">
+    <p>BICARA © 2025 | Teknologi Asisten Suara Cerdas Indonesia</p>
+</div>
+"""
+
+# Serve the CSS background images as cacheable static files
+gr.set_static_paths(paths=[ASSETS_DIR])
 
 # UI with Gradio Blocks - Completely Redesigned Version with side-by-side layout
 with gr.Blocks(theme=theme, css=custom_css) as demo:
     # New Header
-    gr.HTML("""
-    <div class="app-header">
-        <h1 class="app-logo">BICARA</h1>
-        <p class="app-tagline">Asisten Pintar berbahasa Indonesia</p>
-    </div>
-    """)
+    gr.HTML(_HEADER_HTML)
     
     # Main content with two columns side by side
     with gr.Row(equal_height=True):
@@ -499,12 +652,7 @@ with gr.Blocks(theme=theme, css=custom_css) as demo:
         with gr.Column(scale=1):
             # Voice input card
             with gr.Group(elem_classes="card input-card"):
-                gr.HTML("""
-                <div class="card-header">
-                    <div class="card-icon">🎙️</div>
-                    <h2 class="card-title">Rekam Pesan Anda</h2>
-                </div>
-                """)
+                gr.HTML(_INPUT_CARD_HTML)
                 
                 # Audio input with microphone
                 audio_input = gr.Audio(
@@ -516,17 +664,9 @@ with gr.Blocks(theme=theme, css=custom_css) as demo:
                 
                 # Recording indicators
                 with gr.Group(elem_classes="recording-status"):
-                    ready_indicator = gr.HTML("""
-                    <div class="ready-to-record">
-                        <span class="status-icon">⚪</span> Siap merekam suara Anda
-                    </div>
-                    """, visible=True)
+                    ready_indicator = gr.HTML(_READY_HTML, visible=True)
                     
-                    recording_active = gr.HTML("""
-                    <div class="now-recording">
-                        <span class="status-icon">⦿</span> Merekam suara...
-                    </div>
-                    """, visible=False)
+                    recording_active = gr.HTML(_RECORDING_HTML, visible=False)
                 
                 # Submit button
                 submit_btn = gr.Button(
@@ -543,28 +683,13 @@ with gr.Blocks(theme=theme, css=custom_css) as demo:
                 
                 # Processing indicator that won't overlap
                 with gr.Group(elem_classes="processing-indicator", visible=False) as processing_indicator:
-                    gr.HTML("""
-                    <div class="progress-bar">
-                        <div class="progress-status">
-                            <div class="progress-icon">⏳</div>
-                            <div class="progress-text">Memproses permintaan...</div>
-                        </div>
-                        <div class="progress-track">
-                            <div class="progress-fill"></div>
-                        </div>
-                    </div>
-                    """)
+                    gr.HTML(_PROGRESS_HTML)
         
         # RIGHT COLUMN - Voice output
         with gr.Column(scale=1):
             # Voice output card
             with gr.Group(elem_classes="card audio-output-card"):
-                gr.HTML("""
-                <div class="card-header">
-                    <div class="card-icon">🔊</div>
-                    <h2 class="card-title">Respon Asisten</h2>
-                </div>
-                """)
+                gr.HTML(_OUTPUT_CARD_HTML)
                 
                 # Audio output with improved styling
                 audio_output = gr.Audio(
@@ -577,20 +702,12 @@ with gr.Blocks(theme=theme, css=custom_css) as demo:
                 )
     
     # New Footer
-    gr.HTML("""
-    <div class="app-footer">
-        <p>BICARA © 2025 | Teknologi Asisten Suara Cerdas Indonesia</p>
-    </div>
-    """)
+    gr.HTML(_FOOTER_HTML)
     
     # Define event handlers
-    def update_status(message, is_error=False, is_warning=False):
-        if is_error:
-            return f'<div class="status-box status-error">{message}</div>'
-        elif is_warning:
-            return f'<div class="status-box status-warning">{message}</div>'
-        else:
-            return f'<div class="status-box status-success">{message}</div>'
+    def update_status(message, kind="success"):
+        prefix, suffix = _STATUS_TPL[kind]
+        return prefix + message + suffix
     
     # Processing indicator control functions
     def show_processing():
@@ -601,13 +718,13 @@ with gr.Blocks(theme=theme, css=custom_css) as demo:
     
     # Recording start event
     audio_input.start_recording(
-        fn=lambda: recording_state(True),
+        fn=lambda: _REC_ON,
         outputs=[recording_active, ready_indicator]
     )
     
     # Recording stop event
     audio_input.stop_recording(
-        fn=lambda: recording_state(False),
+        fn=lambda: _REC_OFF,
         outputs=[recording_active, ready_indicator]
     )
     